@@ -0,0 +1,154 @@
+"""
+Pool of assistant accounts that stream in voice chats
+Each chat sticks to one assistant; new calls go to the least-loaded healthy one
+"""
+
+import os
+import time
+import logging
+from pyrogram import Client
+from pytgcalls import PyTgCalls
+
+log = logging.getLogger(__name__)
+
+# Pyrogram session strings of extra assistant accounts (comma separated)
+ASSISTANT_SESSIONS = [
+    session.strip()
+    for session in os.getenv('ASSISTANT_SESSIONS', '').split(',')
+    if session.strip()
+]
+
+# Calls one account can serve well - above this other assistants are preferred
+MAX_CALLS_PER_ASSISTANT = int(os.getenv('MAX_CALLS_PER_ASSISTANT', 10))
+
+
+class Assistant:
+    def __init__(self, name, client, calls):
+        self.name = name
+        self.client = client
+        self.calls = calls
+        self.chats = set()
+        self.limited_until = 0
+
+    def is_healthy(self):
+        return time.monotonic() >= self.limited_until
+
+    def mark_rate_limited(self, seconds):
+        self.limited_until = time.monotonic() + seconds
+        log.warning(f"⚠️ Assistant {self.name} rate-limited for {seconds}s")
+
+
+class AssistantPool:
+    def __init__(self):
+        self.assistants = []
+        self.assigned = {}
+        # Per chat: assistants that failed to join it (not a member, banned, ...)
+        self.rejected = {}
+
+    def __iter__(self):
+        return iter(self.assistants)
+
+    def add(self, assistant):
+        self.assistants.append(assistant)
+
+    def get(self, chat_id):
+        """Assistant currently serving a chat (None if not in a call)"""
+        return self.assigned.get(chat_id)
+
+    async def assign(self, chat_id, exclude=None):
+        """Sticky assignment - keep the current assistant while it is healthy"""
+        current = self.assigned.get(chat_id)
+        rejected = self.rejected.get(chat_id, set())
+        if current and current is not exclude and current not in rejected and current.is_healthy():
+            return current
+
+        usable = [a for a in self.assistants if a not in rejected] or self.assistants
+        candidates = [a for a in usable if a is not exclude] or usable
+        healthy = [a for a in candidates if a.is_healthy()]
+        if healthy:
+            # Least-loaded, preferring assistants below their call limit
+            assistant = min(
+                healthy,
+                key=lambda a: (len(a.chats) >= MAX_CALLS_PER_ASSISTANT, len(a.chats))
+            )
+        else:
+            # Everyone is rate-limited - use whoever recovers first
+            assistant = min(candidates, key=lambda a: a.limited_until)
+
+        self.release(chat_id)
+        assistant.chats.add(chat_id)
+        self.assigned[chat_id] = assistant
+        if assistant is not current:
+            log.info(f"🎙 Chat {chat_id} assigned to assistant {assistant.name} ({len(assistant.chats)} call(s))")
+            # The old account would otherwise stay in the voice chat for good
+            if current:
+                try:
+                    await current.calls.leave_call(chat_id)
+                except Exception as e:
+                    log.debug(f"Assistant {current.name} leave error: {e}")
+        return assistant
+
+    async def failover(self, chat_id, seconds):
+        """Mark the chat's assistant as rate-limited and move the chat to another"""
+        current = self.assigned.get(chat_id)
+        if current:
+            current.mark_rate_limited(seconds)
+        return await self.assign(chat_id, exclude=current)
+
+    async def reject(self, chat_id):
+        """The chat's assistant can't play there - move the chat to one that hasn't failed yet"""
+        current = self.assigned.get(chat_id)
+        rejected = self.rejected.setdefault(chat_id, set())
+        if current:
+            rejected.add(current)
+        if all(a in rejected for a in self.assistants):
+            # Nobody left to try
+            return None
+        return await self.assign(chat_id, exclude=current)
+
+    def clear_rejected(self, chat_id):
+        self.rejected.pop(chat_id, None)
+
+    def seconds_until_available(self):
+        """Time until the first rate-limited assistant recovers (0 if one is healthy)"""
+        now = time.monotonic()
+        return max(0, min(a.limited_until for a in self.assistants) - now)
+
+    def release(self, chat_id):
+        assistant = self.assigned.pop(chat_id, None)
+        if assistant:
+            assistant.chats.discard(chat_id)
+
+    async def start(self):
+        """Start every assistant - accounts that fail to log in are dropped"""
+        for assistant in list(self.assistants):
+            try:
+                await assistant.calls.start()
+                log.info(f"🎙 Assistant {assistant.name} started")
+            except Exception as e:
+                if assistant is self.assistants[0]:
+                    raise
+                log.error(f"❌ Assistant {assistant.name} failed to start: {e}")
+                self.assistants.remove(assistant)
+
+    async def stop(self):
+        for assistant in self.assistants:
+            try:
+                await assistant.client.stop()
+            except Exception as e:
+                log.warning(f"Assistant {assistant.name} stop error: {e}")
+
+
+def create_assistants(api_id, api_hash):
+    """Build an Assistant (client + PyTgCalls) for each ASSISTANT_SESSIONS entry"""
+    assistants = []
+    for i, session in enumerate(ASSISTANT_SESSIONS, 1):
+        client = Client(
+            f"assistant_{i}",
+            api_id=api_id,
+            api_hash=api_hash,
+            session_string=session,
+            in_memory=True
+        )
+        assistants.append(Assistant(f"assistant_{i}", client, PyTgCalls(client)))
+    return assistants
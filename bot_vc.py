@@ -4,24 +4,42 @@ Download music OR stream in voice chats!
 """
 
 import os
+import glob
+import json
+import time
+import signal
 import asyncio
+import threading
 import logging
 from pyrogram import Client, filters
+from pyrogram.errors import FloodWait
 from pyrogram.types import Message
 from pytgcalls import PyTgCalls
 from pytgcalls.types import MediaStream
+try:
+    from pytgcalls.types import StreamEnded
+except ImportError:
+    from pytgcalls.types import StreamAudioEnded as StreamEnded
 try:
     import yt_dlp
 except ImportError:
     import youtube_dl as yt_dlp
 from collections import deque
+from contextlib import asynccontextmanager
+from io import BytesIO
 from pathlib import Path
+from http_client import start_session, close_session, fetch_thumbnail
+from scheduler import (
+    JobScheduler, available_cpus, FETCH_JOBS, JOBS_PER_CORE,
+    PRIORITY_PLAYBACK, PRIORITY_QUEUED, PRIORITY_BULK
+)
+from track_index import TrackIndex
+from media_check import DownloadSizeCheck, verify_audio_file, transcode_mp3
+from log_config import setup_logging, ytdl_log_options
+from assistants import Assistant, AssistantPool, create_assistants
 
 # Setup logging first
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Try to import from config_vc.py (local development)
@@ -34,7 +52,8 @@ except ImportError:
     API_ID = int(os.getenv('API_ID'))
     API_HASH = os.getenv('API_HASH')
     BOT_TOKEN = os.getenv('BOT_TOKEN')
-    DOWNLOAD_PATH = os.path.join(Path(__file__).parent, 'downloads')
+    # Point at a persistent disk to keep downloads (and .part files) across redeploys
+    DOWNLOAD_PATH = os.getenv('DOWNLOAD_PATH', os.path.join(Path(__file__).parent, 'downloads'))
     
     # Debug: Log loaded values (hide sensitive parts)
     logger.info(f"Using environment variables:")
@@ -45,6 +64,51 @@ except ImportError:
 # Create downloads directory
 os.makedirs(DOWNLOAD_PATH, exist_ok=True)
 
+# Index of downloaded tracks - equivalent uploads reuse one cached file
+track_index = TrackIndex(os.path.join(DOWNLOAD_PATH, 'track_index.json'))
+
+# /download works in its own directory so it never touches indexed /play files
+MP3_DOWNLOAD_PATH = os.path.join(DOWNLOAD_PATH, 'mp3')
+os.makedirs(MP3_DOWNLOAD_PATH, exist_ok=True)
+
+# Partial downloads older than this are abandoned and removed at startup
+PART_MAX_AGE = int(os.getenv('PART_MAX_AGE', 24 * 60 * 60))
+
+# One writer per (video id, format) - two resumes of one .part file corrupt it
+partial_locks = {}
+
+
+@asynccontextmanager
+async def partial_file_lock(video: dict):
+    """Serialize downloads that would write the same partial file"""
+    key = (video.get('id'), video.get('format_id'))
+    entry = partial_locks.setdefault(key, {'lock': asyncio.Lock(), 'users': 0})
+    entry['users'] += 1
+    try:
+        async with entry['lock']:
+            yield
+    finally:
+        entry['users'] -= 1
+        if entry['users'] == 0:
+            partial_locks.pop(key, None)
+
+
+def cleanup_stale_partials():
+    """Remove .part files from downloads that were never resumed"""
+    cutoff = time.time() - PART_MAX_AGE
+    removed = 0
+    for directory in (DOWNLOAD_PATH, MP3_DOWNLOAD_PATH):
+        for pattern in ('*.part', '*.ytdl'):
+            for path in glob.glob(os.path.join(directory, pattern)):
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+    if removed:
+        logger.info(f"🧹 Removed {removed} stale partial download(s)")
+
 # Initialize Pyrogram client
 app = Client(
     "music_bot_v2",
@@ -56,6 +120,17 @@ app = Client(
 # Initialize PyTgCalls
 pytgcalls = PyTgCalls(app)
 
+# Voice chat assistants - the main client plus any ASSISTANT_SESSIONS accounts
+assistants = AssistantPool()
+assistants.add(Assistant('main', app, pytgcalls))
+for extra_assistant in create_assistants(API_ID, API_HASH):
+    assistants.add(extra_assistant)
+
+# Worker pools (playback before bulk downloads, one slot reserved for playback)
+# Network fetches and CPU-bound FFmpeg work are limited separately
+fetch_jobs = JobScheduler(FETCH_JOBS, name='fetch-job')
+cpu_jobs = JobScheduler(available_cpus() * JOBS_PER_CORE, name='ffmpeg-job')
+
 # Queue system for each chat
 queues = {}
 
@@ -67,6 +142,9 @@ class Queue:
     def add(self, item):
         self.items.append(item)
     
+    def add_first(self, item):
+        self.items.appendleft(item)
+    
     def remove(self):
         if self.items:
             return self.items.popleft()
@@ -89,21 +167,201 @@ def get_queue(chat_id):
     return queues[chat_id]
 
 
-async def download_audio(query: str, msg: Message):
+def calls_for(chat_id):
+    """PyTgCalls instance serving a chat (main one if no assistant is assigned)"""
+    assistant = assistants.get(chat_id)
+    return assistant.calls if assistant else pytgcalls
+
+
+# Song currently streaming in each chat (already removed from its queue)
+now_playing = {}
+
+# Drain mode - used for zero-downtime redeploys
+# Max seconds to wait for in-flight downloads (Render sends SIGKILL after 30s)
+# After the deadline running downloads are aborted; an FFmpeg transcode that
+# is already running cannot be interrupted, so the deadline is best-effort
+DRAIN_TIMEOUT = int(os.getenv('DRAIN_TIMEOUT', 25))
+# Set QUEUE_SNAPSHOT_FILE to a persistent disk path - the app directory is wiped on redeploy
+QUEUE_SNAPSHOT_FILE = os.getenv('QUEUE_SNAPSHOT_FILE', os.path.join(DOWNLOAD_PATH, 'queue_snapshot.json'))
+
+draining = False
+active_downloads = 0
+downloads_idle = asyncio.Event()
+downloads_idle.set()
+shutdown_event = asyncio.Event()
+
+# Set after the drain deadline - checked by yt-dlp progress hooks in worker threads
+abort_downloads = threading.Event()
+
+DRAINING_TEXT = (
+    "🔄 **Bot is restarting!**\n\n"
+    "Please try again in a minute."
+)
+
+
+@asynccontextmanager
+async def track_download():
+    """Count an in-flight download so drain mode can wait for it"""
+    global active_downloads
+    active_downloads += 1
+    downloads_idle.clear()
+    try:
+        yield
+    finally:
+        active_downloads -= 1
+        if active_downloads == 0:
+            downloads_idle.set()
+
+
+def request_shutdown():
+    """Enter drain mode (SIGTERM or the web /drain endpoint)"""
+    global draining
+    if not draining:
+        logger.info("🔄 Drain requested - no longer accepting new work")
+    draining = True
+    shutdown_event.set()
+
+
+def handle_interrupt():
+    """First Ctrl+C drains, a second one exits immediately"""
+    if draining:
+        logger.warning("⚠️ Second interrupt - exiting without drain")
+        os._exit(1)
+    request_shutdown()
+
+
+def abort_hook(status):
+    """yt-dlp progress hook - stop the transfer once the drain deadline passed"""
+    if abort_downloads.is_set():
+        raise yt_dlp.utils.DownloadCancelled("Download aborted for shutdown")
+
+
+def save_queue_snapshot():
+    """Save now playing + queued songs so the next instance can resume"""
+    snapshot = {}
+    for chat_id in set(queues) | set(now_playing):
+        songs = []
+        if chat_id in now_playing:
+            songs.append(now_playing[chat_id])
+        songs.extend(get_queue(chat_id).get_list())
+        if songs:
+            snapshot[str(chat_id)] = songs
+    
+    try:
+        os.makedirs(os.path.dirname(QUEUE_SNAPSHOT_FILE), exist_ok=True)
+        with open(QUEUE_SNAPSHOT_FILE, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        logger.info(f"💾 Saved queue snapshot for {len(snapshot)} chat(s)")
+    except Exception as e:
+        logger.error(f"Queue snapshot error: {e}")
+
+
+async def restore_queue_snapshot():
+    """Resume queues saved by a previous instance during drain"""
+    if not os.path.exists(QUEUE_SNAPSHOT_FILE):
+        return
+    
+    try:
+        with open(QUEUE_SNAPSHOT_FILE, encoding='utf-8') as f:
+            snapshot = json.load(f)
+        os.remove(QUEUE_SNAPSHOT_FILE)
+    except Exception as e:
+        logger.error(f"Queue restore error: {e}")
+        return
+    
+    await asyncio.gather(*(
+        restore_chat_queue(int(chat_id), songs)
+        for chat_id, songs in snapshot.items()
+    ))
+
+
+async def restore_chat_queue(chat_id: int, songs: list):
+    """Re-queue one chat's songs, re-fetching any whose file did not survive"""
+    queue = get_queue(chat_id)
+    restored = 0
+    
+    for song in songs:
+        if draining:
+            return
+        
+        if not os.path.exists(song['file']):
+            # Fresh instance (no persistent disk) - fetch again from the saved URL
+            if chat_id in now_playing:
+                priority = PRIORITY_QUEUED
+            else:
+                priority = PRIORITY_PLAYBACK
+            async with track_download():
+                fetched = await download_audio(song['url'], chat_id, song['requested_by'], priority)
+            if not fetched:
+                logger.warning(f"⚠️ Could not restore '{song['title']}' for chat {chat_id}")
+                continue
+            song = fetched
+        
+        queue.add(song)
+        restored += 1
+        # Start playback as soon as the first song is ready
+        if chat_id not in now_playing:
+            await play_next(chat_id)
+    
+    logger.info(f"♻️ Restored {restored} song(s) for chat {chat_id}")
+
+
+async def drain():
+    """Finish in-flight work, save queues, leave calls and stop the bot"""
+    request_shutdown()
+    
+    # Let current downloads finish (up to the deadline)
+    if active_downloads:
+        logger.info(f"⏳ Waiting up to {DRAIN_TIMEOUT}s for {active_downloads} download(s)")
+        try:
+            await asyncio.wait_for(downloads_idle.wait(), timeout=DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Aborting {active_downloads} download(s) still running after {DRAIN_TIMEOUT}s")
+            abort_downloads.set()
+    fetch_jobs.shutdown()
+    cpu_jobs.shutdown()
+    
+    # Partial (.part) files are kept - the next instance resumes them when
+    # DOWNLOAD_PATH is on a persistent disk (older than PART_MAX_AGE are pruned)
+    
+    save_queue_snapshot()
+    
+    # Nothing may start playing again while we leave the calls
+    for queue in queues.values():
+        queue.clear()
+    
+    # Leave every active call cleanly
+    for chat_id in list(now_playing):
+        try:
+            await calls_for(chat_id).leave_call(chat_id)
+        except:
+            pass
+        assistants.release(chat_id)
+    now_playing.clear()
+    
+    await assistants.stop()
+    
+    logger.info("👋 Drain complete")
+
+
+async def download_audio(query: str, chat_id: int, requested_by: str, priority=PRIORITY_PLAYBACK):
     """Download audio from YouTube with retry logic"""
-    logger.info(f"[DOWNLOAD] Starting download for query: {query}")
+    # Context attached to every structured log record of this download
+    ctx = {'chat_id': chat_id, 'query': query}
+    logger.info("[DOWNLOAD] Starting download", extra=ctx)
     
     # Check if it's a direct YouTube URL
     is_url = query.startswith(('http://', 'https://', 'youtu.be', 'youtube.com'))
     if is_url:
-        logger.info("[DOWNLOAD] Direct URL detected, skipping search")
+        logger.debug("[DOWNLOAD] Direct URL detected, skipping search", extra=ctx)
     
     # Enhanced options for bot detection bypass
     base_opts = {
         'format': 'bestaudio/best',
-        'outtmpl': os.path.join(DOWNLOAD_PATH, '%(id)s.%(ext)s'),
-        'quiet': True,
-        'no_warnings': True,
+        # Keyed by video ID + format so a retry resumes the same partial file
+        'outtmpl': os.path.join(DOWNLOAD_PATH, '%(id)s.%(format_id)s.%(ext)s'),
+        'continuedl': True,
+        'nopart': False,
         'extract_flat': False,
         'nocheckcertificate': True,
         'prefer_insecure': False,
@@ -135,7 +393,7 @@ async def download_audio(query: str, msg: Message):
     youtube_cookies = os.getenv('YOUTUBE_COOKIES')
     cookie_file_path = None
     if youtube_cookies:
-        logger.info("[DOWNLOAD] Using cookies from YOUTUBE_COOKIES environment variable")
+        logger.debug("[DOWNLOAD] Using cookies from YOUTUBE_COOKIES environment variable")
         # Save cookies to temporary file with proper format
         import tempfile
         cookie_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt', encoding='utf-8')
@@ -143,36 +401,49 @@ async def download_audio(query: str, msg: Message):
         cookie_file.close()
         cookie_file_path = cookie_file.name
         base_opts['cookiefile'] = cookie_file_path
-        logger.info(f"[DOWNLOAD] Cookie file created at: {cookie_file_path}")
+        logger.debug("[DOWNLOAD] Cookie file created at: %s", cookie_file_path)
     else:
         logger.warning("[DOWNLOAD] No YouTube cookies found in environment")
     
     # Try multiple strategies with delays between attempts
+    # yt-dlp verbosity follows the runtime switch (YTDL_VERBOSE / web /debug/ytdl)
     strategies = [
         # Strategy 1: Android client with cookies (most reliable)
-        lambda opts: {**opts, 'extractor_args': {'youtube': {'player_client': ['android']}}, 'verbose': True, 'quiet': False},
+        lambda opts: {**opts, 'extractor_args': {'youtube': {'player_client': ['android']}}, **ytdl_log_options()},
         # Strategy 2: iOS client
-        lambda opts: {**opts, 'extractor_args': {'youtube': {'player_client': ['ios']}}, 'verbose': True, 'quiet': False},
+        lambda opts: {**opts, 'extractor_args': {'youtube': {'player_client': ['ios']}}, **ytdl_log_options()},
         # Strategy 3: Web client with cookies
-        lambda opts: {**opts, 'extractor_args': {'youtube': {'player_client': ['web']}}, 'format': 'ba[ext=m4a]/ba', 'verbose': True, 'quiet': False},
+        lambda opts: {**opts, 'extractor_args': {'youtube': {'player_client': ['web']}}, 'format': 'ba[ext=m4a]/ba', **ytdl_log_options()},
     ]
     
     for attempt, strategy in enumerate(strategies, 1):
+        ydl_opts = strategy(base_opts)
+        size_check = DownloadSizeCheck()
+        ydl_opts['progress_hooks'] = [abort_hook, size_check]
+        client = ydl_opts.get('extractor_args', {}).get('youtube', {}).get('player_client', ['unknown'])[0]
+        attempt_ctx = {**ctx, 'attempt': attempt, 'client': client}
+        
         try:
             if attempt > 1:
                 # Add delay between retries (exponential backoff)
                 wait_time = 2 ** (attempt - 1)
-                logger.info(f"Attempt {attempt}: Waiting {wait_time}s before retry...")
+                logger.info("[DOWNLOAD] Waiting %ss before retry", wait_time, extra=attempt_ctx)
                 await asyncio.sleep(wait_time)
             
-            ydl_opts = strategy(base_opts)
-            
-            logger.info(f"[DOWNLOAD] Attempt {attempt}: Trying with {ydl_opts.get('extractor_args', {}).get('youtube', {}).get('player_client', ['unknown'])[0]} client")
+            logger.info("[DOWNLOAD] Trying %s client", client, extra=attempt_ctx)
             
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 # Use direct URL or search
-                search_query = query if is_url else f"ytsearch5:{query}"
-                info = ydl.extract_info(search_query, download=True)
+                # Resolve metadata first - the download only happens on a cache miss
+                search_query = query if is_url else f"ytsearch1:{query}"
+                started = time.monotonic()
+                info = await fetch_jobs.run(
+                    ydl.extract_info, search_query, download=False, priority=priority
+                )
+                logger.info(
+                    "[DOWNLOAD] Resolved metadata",
+                    extra={**attempt_ctx, 'duration_ms': int((time.monotonic() - started) * 1000)}
+                )
                 
                 # Handle both direct URL and search results
                 if is_url:
@@ -183,10 +454,10 @@ async def download_audio(query: str, msg: Message):
                 else:
                     # Search results - check if we got any entries
                     if not info or 'entries' not in info or len(info['entries']) == 0:
-                        logger.error(f"[DOWNLOAD] Attempt {attempt}: Search returned 0 results for query: {query}")
+                        logger.error("[DOWNLOAD] Search returned 0 results", extra=attempt_ctx)
                         if attempt == len(strategies):
                             # On last attempt, return None with specific error
-                            logger.error("[DOWNLOAD] No search results found after all attempts")
+                            logger.error("[DOWNLOAD] No search results found after all attempts", extra=ctx)
                             if cookie_file_path:
                                 try:
                                     import os as os_module
@@ -199,37 +470,79 @@ async def download_audio(query: str, msg: Message):
                     # Get first result from search
                     video = info['entries'][0]
                 
-                # Prepare filename (works for both URL and search)
-                filename = ydl.prepare_filename(video)
+                attempt_ctx['video_id'] = video.get('id')
                 
-                logger.info(f"Successfully downloaded: {video['title']}")
+                # Serve an equivalent already-downloaded track if we have one
+                filename = track_index.lookup(video)
+                if not filename:
+                    started = time.monotonic()
+                    async with partial_file_lock(video):
+                        # Another chat may have finished this track while we waited
+                        filename = track_index.lookup(video)
+                        if not filename:
+                            video = await fetch_jobs.run(
+                                ydl.process_ie_result, video, download=True, priority=priority
+                            )
+                if filename:
+                    logger.info("[DOWNLOAD] Reusing cached track", extra=attempt_ctx)
+                else:
+                    
+                    # Prepare filename (works for both URL and search)
+                    filename = ydl.prepare_filename(video)
+                    
+                    # Catch truncated files before they reach MediaStream:
+                    # raw byte count from the progress hook, then the final file's duration
+                    problem = size_check.problem or await cpu_jobs.run(
+                        verify_audio_file,
+                        filename,
+                        expected_duration=video.get('duration'),
+                        priority=priority
+                    )
+                    if problem:
+                        for bad_file in {filename, size_check.filename}:
+                            try:
+                                if bad_file:
+                                    os.remove(bad_file)
+                            except OSError:
+                                pass
+                        raise Exception(f"Integrity check failed: {problem}")
+                    
+                    track_index.add(video, filename)
+                    
+                    logger.info(
+                        "[DOWNLOAD] Successfully downloaded",
+                        extra={**attempt_ctx, 'duration_ms': int((time.monotonic() - started) * 1000)}
+                    )
                 return {
                     'file': filename,
                     'title': video['title'],
                     'duration': video.get('duration', 0),
                     'url': video['webpage_url'],
                     'thumbnail': video.get('thumbnail'),
-                    'requested_by': msg.from_user.mention
+                    'requested_by': requested_by
                 }
         except Exception as e:
             error_msg = str(e)
             error_type = type(e).__name__
             
-            # Log full error for debugging
-            logger.error(f"[DOWNLOAD] Attempt {attempt} failed: {error_type}")
-            logger.error(f"[DOWNLOAD] Error message: {error_msg[:300]}")
+            # Shutting down - no point trying other strategies
+            if abort_downloads.is_set():
+                break
+            
+            # One record per failure with the error type and the start of the message
+            logger.error("[DOWNLOAD] Attempt failed: %s: %s", error_type, error_msg[:300], extra=attempt_ctx)
             
             if 'could not find chrome cookies' in error_msg.lower():
-                logger.debug(f"Attempt {attempt}: No Chrome cookies available, trying next strategy")
+                logger.debug("[DOWNLOAD] No Chrome cookies available, trying next strategy", extra=attempt_ctx)
                 continue
             elif 'sign in to confirm' in error_msg.lower() or 'bot' in error_msg.lower():
-                logger.warning(f"Attempt {attempt}: Bot detection triggered, trying next strategy")
+                logger.warning("[DOWNLOAD] Bot detection triggered, trying next strategy", extra=attempt_ctx)
                 continue
             elif 'private' in error_msg.lower() or 'unavailable' in error_msg.lower():
-                logger.warning(f"Attempt {attempt}: Video unavailable or private")
+                logger.warning("[DOWNLOAD] Video unavailable or private", extra=attempt_ctx)
                 continue
             else:
-                logger.error(f"Attempt {attempt}: Unhandled error, trying next strategy")
+                logger.warning("[DOWNLOAD] Unhandled error, trying next strategy", extra=attempt_ctx)
                 if attempt == len(strategies):
                     # Cleanup temp cookie file if exists
                     if cookie_file_path:
@@ -246,44 +559,89 @@ async def download_audio(query: str, msg: Message):
         try:
             import os as os_module
             os_module.remove(cookie_file_path)
-            logger.info("[DOWNLOAD] Cleaned up temporary cookie file")
+            logger.debug("[DOWNLOAD] Cleaned up temporary cookie file")
         except Exception as cleanup_error:
-            logger.warning(f"[DOWNLOAD] Failed to cleanup cookie file: {cleanup_error}")
+            logger.warning("[DOWNLOAD] Failed to cleanup cookie file: %s", cleanup_error)
     
-    logger.error("[DOWNLOAD] All download strategies failed after trying all methods")
+    logger.error("[DOWNLOAD] All download strategies failed after trying all methods", extra=ctx)
     return None
 
 
 async def play_next(chat_id: int):
     """Play next song in queue"""
+    # Draining - calls are being left, don't start (or rejoin) anything
+    if draining:
+        return
+    
     queue = get_queue(chat_id)
     
     if queue.is_empty():
+        now_playing.pop(chat_id, None)
         try:
-            await pytgcalls.leave_call(chat_id)
+            await calls_for(chat_id).leave_call(chat_id)
         except:
             pass
+        assistants.release(chat_id)
+        assistants.clear_rejected(chat_id)
         return
     
     next_song = queue.remove()
+    now_playing[chat_id] = next_song
     
-    try:
-        await pytgcalls.play(
-            chat_id,
-            MediaStream(next_song['file'])
-        )
-    except Exception as e:
-        logger.error(f"Play error: {e}")
-        await play_next(chat_id)
+    # Sticky per-chat assistant, failing over when an account is rate-limited
+    # or can't join the chat
+    assistant = await assistants.assign(chat_id)
+    while assistant.is_healthy():
+        try:
+            await assistant.calls.play(
+                chat_id,
+                MediaStream(next_song['file'])
+            )
+            return
+        except FloodWait as e:
+            assistant = await assistants.failover(chat_id, e.value)
+        except Exception as e:
+            # Usually a join/membership error on this account - another one may get in
+            logger.warning(f"⚠️ Assistant {assistant.name} can't play in chat {chat_id}: {e}")
+            assistant = await assistants.reject(chat_id)
+            if assistant is None:
+                # Every assistant failed - the song itself is the problem
+                logger.error(f"Play error: {e}")
+                assistants.clear_rejected(chat_id)
+                await play_next(chat_id)
+                return
+    
+    # Every assistant is rate-limited - keep the song and retry when one recovers
+    queue.add_first(next_song)
+    now_playing.pop(chat_id, None)
+    delay = max(1, assistants.seconds_until_available())
+    logger.warning(f"⚠️ All assistants rate-limited, retrying chat {chat_id} in {delay:.0f}s")
+    if chat_id not in play_retries:
+        play_retries[chat_id] = asyncio.create_task(retry_play_next(chat_id, delay))
+
+
+# Pending play_next retries while every assistant is rate-limited
+play_retries = {}
+
+
+async def retry_play_next(chat_id: int, delay: float):
+    """Retry playback in a chat once an assistant has recovered"""
+    await asyncio.sleep(delay)
+    play_retries.pop(chat_id, None)
+    await play_next(chat_id)
 
 
-@pytgcalls.on_update()
 async def on_update_handler(client, update):
     """Auto-play next song when current ends"""
-    # Check if it's a stream ended event
-    if hasattr(update, 'chat_id'):
-        chat_id = update.chat_id
-        await play_next(chat_id)
+    # Only stream-ended events from the assistant currently serving the chat -
+    # updates from an assistant that left after a failover must not skip songs
+    if isinstance(update, StreamEnded) and client is calls_for(update.chat_id):
+        await play_next(update.chat_id)
+
+
+# Every assistant reports its own stream updates
+for assistant in assistants:
+    assistant.calls.on_update()(on_update_handler)
 
 
 @app.on_message(filters.command("start"))
@@ -379,13 +737,24 @@ async def play(client, message: Message):
         )
         return
     
+    if draining:
+        await message.reply_text(DRAINING_TEXT)
+        return
+    
     query = " ".join(message.command[1:])
     chat_id = message.chat.id
     
     msg = await message.reply_text(f"🔍 **Searching:** `{query}`...")
     
+    # The next track to play is fetched ahead of songs further back
+    if get_queue(chat_id).is_empty():
+        priority = PRIORITY_PLAYBACK
+    else:
+        priority = PRIORITY_QUEUED
+    
     # Download audio
-    song = await download_audio(query, message)
+    async with track_download():
+        song = await download_audio(query, chat_id, message.from_user.mention, priority)
     
     if not song:
         try:
@@ -451,7 +820,7 @@ async def pause(client, message: Message):
     chat_id = message.chat.id
     
     try:
-        await pytgcalls.pause_stream(chat_id)
+        await calls_for(chat_id).pause_stream(chat_id)
         await message.reply_text("⏸ **Paused!**")
     except Exception as e:
         await message.reply_text(f"❌ **Error:** {str(e)}")
@@ -463,7 +832,7 @@ async def resume(client, message: Message):
     chat_id = message.chat.id
     
     try:
-        await pytgcalls.resume_stream(chat_id)
+        await calls_for(chat_id).resume_stream(chat_id)
         await message.reply_text("▶️ **Resumed!**")
     except Exception as e:
         await message.reply_text(f"❌ **Error:** {str(e)}")
@@ -490,8 +859,10 @@ async def stop(client, message: Message):
     queue = get_queue(chat_id)
     
     try:
-        await pytgcalls.leave_call(chat_id)
+        await calls_for(chat_id).leave_call(chat_id)
         queue.clear()
+        now_playing.pop(chat_id, None)
+        assistants.release(chat_id)
         await message.reply_text("⏹ **Stopped!** Left voice chat.")
     except Exception as e:
         await message.reply_text(f"❌ **Error:** {str(e)}")
@@ -549,19 +920,33 @@ async def download(client, message: Message):
         )
         return
     
+    if draining:
+        await message.reply_text(DRAINING_TEXT)
+        return
+    
     query = " ".join(message.command[1:])
     msg = await message.reply_text(f"🔍 **Searching:** `{query}`...")
     
+    async with track_download():
+        await _download_mp3(query, message, msg)
+
+
+# Download attempts for /download (partial files are resumed between attempts)
+MP3_ATTEMPTS = 3
+
+
+async def _download_mp3(query: str, message: Message, msg: Message):
+    """Download, convert and upload a song as MP3"""
     # Enhanced options for bot detection bypass
     base_opts = {
+        # MP3 conversion runs as a separate CPU job (see transcode_mp3)
         'format': 'bestaudio/best',
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }],
-        'outtmpl': os.path.join(DOWNLOAD_PATH, '%(title)s.%(ext)s'),
-        'quiet': True,
+        # Own directory - /play's cached tracks in DOWNLOAD_PATH are never touched
+        # Keyed by video ID + format so a retry resumes the same partial file
+        'outtmpl': os.path.join(MP3_DOWNLOAD_PATH, '%(id)s.%(format_id)s.%(ext)s'),
+        'continuedl': True,
+        'nopart': False,
+        **ytdl_log_options(),
         'nocheckcertificate': True,
         'socket_timeout': 30,
         'retries': 3,
@@ -583,12 +968,18 @@ async def download(client, message: Message):
     
     # Try multiple times with delay
     ydl_opts = base_opts.copy()
+    size_check = DownloadSizeCheck()
+    ydl_opts['progress_hooks'] = [abort_hook, size_check]
     
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(f"ytsearch1:{query}", download=True)
+            # Resolve first - the format must be known to lock its partial file
+            # Bulk job - yields to playback fetches in the scheduler
+            info = await fetch_jobs.run(
+                ydl.extract_info, f"ytsearch1:{query}", download=False, priority=PRIORITY_BULK
+            )
             
-            if not info or 'entries' not in info:
+            if not info or not info.get('entries'):
                 try:
                     await msg.edit_text(
                         "❌ **Download failed!**\n\n"
@@ -619,18 +1010,70 @@ async def download(client, message: Message):
             except:
                 msg = await message.reply_text("⬇️ **Downloading...**")
             
+            # Unique per request - another /download of the same song may still be uploading
             filename = ydl.prepare_filename(video)
-            mp3_file = os.path.splitext(filename)[0] + '.mp3'
+            mp3_file = f"{os.path.splitext(filename)[0]}.{message.id}.mp3"
+            
+            # Held until the raw file is transcoded and removed
+            async with partial_file_lock(video):
+                for attempt in range(1, MP3_ATTEMPTS + 1):
+                    try:
+                        size_check.reset()
+                        await fetch_jobs.run(
+                            ydl.process_ie_result, dict(video), download=True, priority=PRIORITY_BULK
+                        )
+                        if size_check.problem:
+                            if size_check.filename and os.path.exists(size_check.filename):
+                                os.remove(size_check.filename)
+                            raise yt_dlp.utils.DownloadError(f"Integrity check failed: {size_check.problem}")
+                        break
+                    except yt_dlp.utils.DownloadError as e:
+                        if attempt == MP3_ATTEMPTS:
+                            raise
+                        # The .part file is kept, so the next attempt resumes it
+                        wait_time = 2 ** attempt
+                        logger.warning(
+                            "[MP3] Attempt failed, resuming in %ss: %s", wait_time, str(e)[:200],
+                            extra={'chat_id': message.chat.id, 'query': query, 'attempt': attempt}
+                        )
+                        await asyncio.sleep(wait_time)
+                
+                # Transcode in the CPU pool so it never blocks playback fetches
+                # (the raw file lives in MP3_DOWNLOAD_PATH - never a cached /play track)
+                converted = await cpu_jobs.run(
+                    transcode_mp3, filename, mp3_file, priority=PRIORITY_BULK
+                )
+                if os.path.exists(filename):
+                    os.remove(filename)
+            if not converted:
+                raise Exception("MP3 conversion failed")
+            
+            problem = await cpu_jobs.run(
+                verify_audio_file, mp3_file, expected_duration=duration, priority=PRIORITY_BULK
+            )
+            if problem:
+                if os.path.exists(mp3_file):
+                    os.remove(mp3_file)
+                raise Exception(f"Integrity check failed: {problem}")
             
             try:
                 await msg.edit_text("📤 **Uploading...**")
             except:
                 msg = await message.reply_text("📤 **Uploading...**")
             
+            # Fetch cover art through the shared HTTP session
+            thumb = None
+            thumb_data = await fetch_thumbnail(video.get('id'))
+            if thumb_data:
+                thumb = BytesIO(thumb_data)
+                thumb.name = "thumb.jpg"
+            
             await message.reply_audio(
                 audio=mp3_file,
+                file_name=f"{title}.mp3",
                 title=title,
                 duration=duration,
+                thumb=thumb,
                 caption=f"🎵 {title}"
             )
             
@@ -661,13 +1104,33 @@ async def download(client, message: Message):
 
 async def main():
     """Start the bot with web server for 24/7 hosting"""
-    # Start PyTgCalls (this also starts the Pyrogram client)
-    await pytgcalls.start()
+    # Start PyTgCalls for every assistant (this also starts the Pyrogram clients)
+    await assistants.start()
+    
+    # SIGTERM (redeploy) and Ctrl+C start drain mode
+    loop = asyncio.get_running_loop()
+    for sig, handler in ((signal.SIGTERM, request_shutdown), (signal.SIGINT, handle_interrupt)):
+        try:
+            loop.add_signal_handler(sig, handler)
+        except (NotImplementedError, RuntimeError):
+            # Not supported on Windows
+            pass
+    
+    # Shared pooled HTTP session for keep-alive pings and thumbnails
+    await start_session()
     
     logger.info("🎵 Music Bot started with voice chat support!")
     print("🎵 Bot is running! Press Ctrl+C to stop.")
     
+    # Partial files a previous instance never got back to
+    cleanup_stale_partials()
+    
+    # Resume queues saved by the previous instance (re-fetching runs in the background)
+    asyncio.create_task(restore_queue_snapshot())
+    
     # Import web server
+    runner = None
+    keep_alive_task = None
     try:
         from web import web_server, keep_alive
         from aiohttp import web as aiohttp_web
@@ -676,7 +1139,7 @@ async def main():
         PORT = int(os.getenv('PORT', 8080))
         
         # Create web server
-        web_app = web_server()
+        web_app = web_server(on_drain=request_shutdown)
         runner = aiohttp_web.AppRunner(web_app)
         await runner.setup()
         
@@ -688,7 +1151,7 @@ async def main():
         print(f"🌐 Web server: http://0.0.0.0:{PORT}")
         
         # Start keep-alive task
-        asyncio.create_task(keep_alive())
+        keep_alive_task = asyncio.create_task(keep_alive())
         logger.info("🔄 Keep-alive system activated!")
         
     except ImportError:
@@ -698,8 +1161,16 @@ async def main():
         logger.error(f"⚠️ Web server error: {e}")
         print(f"⚠️ Web server failed to start: {e}")
     
-    # Keep bot running
-    await asyncio.Event().wait()
+    # Keep bot running until drain is requested
+    try:
+        await shutdown_event.wait()
+    finally:
+        await drain()
+        if keep_alive_task:
+            keep_alive_task.cancel()
+        if runner:
+            await runner.cleanup()
+        await close_session()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,102 @@
+"""
+Shared HTTP client for all outbound requests
+One pooled keep-alive session is created at startup and closed on shutdown
+"""
+
+import os
+import asyncio
+import aiohttp
+import logging
+
+log = logging.getLogger(__name__)
+
+# Connection pool limits (total and per remote host)
+HTTP_POOL_LIMIT = int(os.getenv('HTTP_POOL_LIMIT', 50))
+HTTP_LIMIT_PER_HOST = int(os.getenv('HTTP_LIMIT_PER_HOST', 8))
+
+# Cache DNS lookups for 5 minutes
+HTTP_DNS_TTL = 5 * 60
+
+# Default timeout for outbound requests (seconds)
+HTTP_TIMEOUT = 10
+
+_session = None
+
+
+async def start_session():
+    """Create the application-wide HTTP session"""
+    global _session
+
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_TTL,
+            use_dns_cache=True,
+            keepalive_timeout=60,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+        )
+        log.info(
+            f"🌐 HTTP session ready (limit={HTTP_POOL_LIMIT}, per host={HTTP_LIMIT_PER_HOST})"
+        )
+    return _session
+
+
+def get_session():
+    """Get the shared HTTP session (call start_session() first)"""
+    if _session is None or _session.closed:
+        raise RuntimeError("HTTP session is not started")
+    return _session
+
+
+async def close_session():
+    """Close the shared HTTP session and its connection pool"""
+    global _session
+
+    if _session is not None and not _session.closed:
+        await _session.close()
+        # Give the connector a moment to close underlying SSL transports
+        await asyncio.sleep(0.25)
+        log.info("🌐 HTTP session closed")
+    _session = None
+
+
+async def fetch_bytes(url: str, max_size: int = 5 * 1024 * 1024):
+    """Fetch a small resource (e.g. a thumbnail) through the shared session"""
+    if not url:
+        return None
+
+    try:
+        session = get_session()
+        async with session.get(url) as resp:
+            if resp.status != 200:
+                log.warning(f"⚠️ Fetch {url} - Status: {resp.status}")
+                return None
+            if resp.content_length and resp.content_length > max_size:
+                log.warning(f"⚠️ Fetch {url} - Too large: {resp.content_length} bytes")
+                return None
+            data = bytearray()
+            async for chunk in resp.content.iter_chunked(64 * 1024):
+                data.extend(chunk)
+                if len(data) > max_size:
+                    log.warning(f"⚠️ Fetch {url} - Too large: over {max_size} bytes")
+                    return None
+            return bytes(data)
+    except asyncio.TimeoutError:
+        log.warning(f"⚠️ Fetch {url} - Timeout")
+    except Exception as e:
+        log.error(f"❌ Fetch {url} error: {e}")
+    return None
+
+
+async def fetch_thumbnail(video_id: str):
+    """Fetch a small JPEG thumbnail for a YouTube video (Telegram limit: 200 kB)"""
+    if not video_id:
+        return None
+    return await fetch_bytes(
+        f"https://i.ytimg.com/vi/{video_id}/mqdefault.jpg",
+        max_size=200 * 1024
+    )
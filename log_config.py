@@ -0,0 +1,167 @@
+"""
+Logging setup - structured JSON records written from a background thread
+Repetitive messages are rate-limited so bursts don't flood Render's log pipeline
+"""
+
+import os
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+# 'json' for structured records, 'text' for the classic one-line format
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+
+# Each message template is logged at most LOG_RATE_LIMIT times per LOG_RATE_WINDOW seconds
+LOG_RATE_LIMIT = int(os.getenv('LOG_RATE_LIMIT', 20))
+LOG_RATE_WINDOW = float(os.getenv('LOG_RATE_WINDOW', 60))
+
+# Extra fields copied into each record when passed via extra={...}
+CONTEXT_FIELDS = ('chat_id', 'video_id', 'query', 'attempt', 'client', 'duration_ms', 'suppressed')
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# yt-dlp output goes through this logger instead of stdout
+ytdl_logger = logging.getLogger('yt_dlp')
+_ytdl_verbose = os.getenv('YTDL_VERBOSE', '').lower() in ('1', 'true', 'on')
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Formatted by StructuredQueueHandler before crossing the queue
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """One-line format with the non-empty context fields appended as key=value"""
+
+    def format(self, record):
+        line = super().format(record)
+        context = ' '.join(
+            f"{field}={getattr(record, field)}"
+            for field in CONTEXT_FIELDS
+            if getattr(record, field, None) is not None
+        )
+        if not context:
+            return line
+        # Keep any traceback below the context
+        first, sep, rest = line.partition('\n')
+        return f"{first} [{context}]{sep}{rest}"
+
+
+class StructuredQueueHandler(QueueHandler):
+    """QueueHandler that keeps the traceback in exc_text instead of merging it into msg"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.formatter.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """Drop repeats of the same message template beyond the limit per window"""
+
+    def __init__(self, limit=LOG_RATE_LIMIT, window=LOG_RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if self.limit <= 0:
+            return True
+
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            state = self.counts.get(key)
+            if state is None or now - state[0] >= self.window:
+                # New window - report how many were dropped in the last one
+                if state and state[2]:
+                    record.suppressed = state[2]
+                self.counts[key] = [now, 1, 0]
+                if len(self.counts) > 1000:
+                    self._prune(now)
+                return True
+            if state[1] < self.limit:
+                state[1] += 1
+                return True
+            state[2] += 1
+            return False
+
+    def _prune(self, now):
+        expired = [k for k, s in self.counts.items() if now - s[0] >= self.window]
+        for k in expired:
+            del self.counts[k]
+
+
+def setup_logging():
+    """Route all logging through a non-blocking queue to a stdout listener thread"""
+    handler = logging.StreamHandler()
+    if LOG_FORMAT == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter())
+    queue_handler.addFilter(RateLimitFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    set_ytdl_verbose(_ytdl_verbose)
+    return listener
+
+
+def set_ytdl_verbose(enabled: bool):
+    """Switch yt-dlp debug output on or off at runtime"""
+    global _ytdl_verbose
+    _ytdl_verbose = enabled
+    ytdl_logger.setLevel(logging.DEBUG if enabled else logging.WARNING)
+
+
+def is_ytdl_verbose():
+    return _ytdl_verbose
+
+
+def ytdl_log_options():
+    """yt-dlp options for the current verbosity (output goes to our logger)"""
+    return {
+        'logger': ytdl_logger,
+        'verbose': _ytdl_verbose,
+        'quiet': not _ytdl_verbose,
+        'no_warnings': not _ytdl_verbose,
+        'noprogress': True,
+    }
@@ -0,0 +1,108 @@
+"""
+FFmpeg helpers for downloaded audio files
+Integrity checks catch truncated downloads before they are queued for playback
+"""
+
+import os
+import json
+import shutil
+import logging
+import subprocess
+
+log = logging.getLogger(__name__)
+
+# Allowed gap between probed and expected duration (seconds or fraction)
+DURATION_TOLERANCE = 2
+DURATION_TOLERANCE_RATIO = 0.05
+
+FFPROBE = shutil.which('ffprobe')
+FFMPEG = shutil.which('ffmpeg') or 'ffmpeg'
+
+
+def probe_duration(path: str):
+    """Read the container duration with ffprobe (None if it can't be parsed)"""
+    result = subprocess.run(
+        [
+            FFPROBE, '-v', 'error',
+            '-show_entries', 'format=duration',
+            '-of', 'json', path
+        ],
+        capture_output=True,
+        text=True,
+        timeout=30
+    )
+    if result.returncode != 0:
+        return None
+    try:
+        return float(json.loads(result.stdout)['format']['duration'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class DownloadSizeCheck:
+    """
+    yt-dlp progress hook comparing the raw byte count with the expected size
+    Runs before post-processors (e.g. the m4a fixup remux) rewrite the file
+    """
+
+    def __init__(self):
+        self.problem = None
+        self.filename = None
+
+    def reset(self):
+        self.problem = None
+        self.filename = None
+
+    def __call__(self, status):
+        if status.get('status') != 'finished':
+            return
+        self.filename = status.get('filename')
+
+        # Missing when yt-dlp found the file already downloaded
+        downloaded = status.get('downloaded_bytes')
+        expected = (status.get('info_dict') or {}).get('filesize') or status.get('total_bytes')
+        if downloaded and expected and downloaded != expected:
+            self.problem = f"size mismatch ({downloaded} of {expected} bytes)"
+
+
+def verify_audio_file(path: str, expected_duration=None):
+    """Return a description of the problem, or None if the final file looks complete"""
+    if not path or not os.path.exists(path):
+        return "file is missing"
+    if os.path.getsize(path) == 0:
+        return "file is empty"
+
+    if not FFPROBE:
+        log.debug("ffprobe not found, skipping container probe")
+        return None
+
+    try:
+        duration = probe_duration(path)
+    except subprocess.TimeoutExpired:
+        return "ffprobe timed out"
+    if duration is None:
+        return "container probe failed"
+
+    if expected_duration:
+        tolerance = max(DURATION_TOLERANCE, expected_duration * DURATION_TOLERANCE_RATIO)
+        if duration < expected_duration - tolerance:
+            return f"duration too short ({duration:.0f}s of {expected_duration}s)"
+    return None
+
+
+def transcode_mp3(src: str, dst: str, bitrate: str = '192k'):
+    """Convert a downloaded file to MP3 with FFmpeg (returns True on success)"""
+    result = subprocess.run(
+        [
+            FFMPEG, '-y', '-v', 'error',
+            '-i', src,
+            '-vn', '-codec:a', 'libmp3lame', '-b:a', bitrate,
+            dst
+        ],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        log.error(f"FFmpeg transcode failed: {result.stderr.strip()[:300]}")
+        return False
+    return True
@@ -0,0 +1,144 @@
+"""
+Priority job schedulers for yt-dlp fetches and FFmpeg work
+Playback fetches run before bulk /download jobs, with aging so bulk jobs never starve
+"""
+
+import os
+import time
+import asyncio
+import itertools
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+# Job priorities (lower runs first)
+PRIORITY_PLAYBACK = 0   # Next track for a voice chat
+PRIORITY_QUEUED = 5     # Track added behind other queued songs
+PRIORITY_BULK = 10      # /download fetch and MP3 transcode
+
+# Concurrent yt-dlp network fetches (I/O bound - not tied to CPU count)
+FETCH_JOBS = int(os.getenv('FETCH_JOBS', 4))
+
+# Concurrent FFmpeg jobs allowed per CPU core
+JOBS_PER_CORE = int(os.getenv('JOBS_PER_CORE', 1))
+
+# A waiting job gains one priority level every AGING_INTERVAL seconds
+AGING_INTERVAL = float(os.getenv('JOB_AGING_INTERVAL', 5))
+
+
+def available_cpus():
+    """CPUs this process may use - honours affinity and container CPU quotas"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        # Not available on Windows / macOS
+        cpus = os.cpu_count() or 1
+
+    # cgroup v2 ("max 100000" or "50000 100000") and v1 quota files
+    quota_files = (
+        ('/sys/fs/cgroup/cpu.max', None),
+        ('/sys/fs/cgroup/cpu/cpu.cfs_quota_us', '/sys/fs/cgroup/cpu/cpu.cfs_period_us'),
+    )
+    for quota_file, period_file in quota_files:
+        try:
+            with open(quota_file) as f:
+                values = f.read().split()
+            if period_file:
+                with open(period_file) as f:
+                    values.append(f.read().strip())
+            quota, period = values[0], values[1]
+            if quota not in ('max', '-1'):
+                cpus = min(cpus, max(1, int(quota) // int(period)))
+            break
+        except (OSError, ValueError, IndexError):
+            continue
+    return cpus
+
+
+class JobScheduler:
+    """
+    Runs blocking jobs in a thread pool, best priority first
+    With 2+ slots one is always kept free of bulk jobs for playback work
+    """
+
+    def __init__(self, max_jobs, name='media-job', aging_interval=AGING_INTERVAL):
+        # The reserved playback slot comes out of the cap, never on top of it
+        self.max_jobs = max(1, max_jobs)
+        self.bulk_limit = self.max_jobs - 1 if self.max_jobs >= 2 else 1
+        self.aging_interval = aging_interval
+        self.running = 0
+        self.bulk_running = 0
+        self.waiting = []
+        self._seq = itertools.count()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_jobs,
+            thread_name_prefix=name
+        )
+        log.info(f"⚙️ {name} pool: {self.max_jobs} slot(s), {self.bulk_limit} for bulk jobs")
+
+    def _effective_priority(self, job, now):
+        priority, queued_at, seq, _ = job
+        return (priority - (now - queued_at) / self.aging_interval, seq)
+
+    def _can_start(self, priority):
+        if self.running >= self.max_jobs:
+            return False
+        if priority >= PRIORITY_BULK and self.bulk_running >= self.bulk_limit:
+            return False
+        return True
+
+    def _dispatch(self):
+        # Start the best eligible waiting jobs (after aging) while slots are free
+        now = time.monotonic()
+        while self.running < self.max_jobs:
+            eligible = [
+                j for j in self.waiting
+                if not j[3].done() and self._can_start(j[0])
+            ]
+            if not eligible:
+                break
+            job = min(eligible, key=lambda j: self._effective_priority(j, now))
+            self.waiting.remove(job)
+            self.running += 1
+            if job[0] >= PRIORITY_BULK:
+                self.bulk_running += 1
+            job[3].set_result(None)
+
+    async def _acquire(self, priority):
+        waiter = asyncio.get_running_loop().create_future()
+        job = (priority, time.monotonic(), next(self._seq), waiter)
+        self.waiting.append(job)
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if job in self.waiting:
+                self.waiting.remove(job)
+            elif waiter.done() and not waiter.cancelled():
+                # Slot was handed over just before cancellation - pass it on
+                self._release(priority)
+            raise
+
+    def _release(self, priority):
+        self.running -= 1
+        if priority >= PRIORITY_BULK:
+            self.bulk_running -= 1
+        self._dispatch()
+
+    async def run(self, func, *args, priority=PRIORITY_BULK, **kwargs):
+        """Run a blocking function in the worker pool once a slot is free"""
+        await self._acquire(priority)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor,
+                functools.partial(func, *args, **kwargs)
+            )
+        finally:
+            self._release(priority)
+
+    def shutdown(self):
+        """Stop accepting work and drop jobs that have not started"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
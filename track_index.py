@@ -0,0 +1,132 @@
+"""
+Local index of downloaded tracks
+Different uploads of the same song (lyric video, official audio, topic channel)
+share one key, so an already-downloaded copy can be reused instead of fetched again
+"""
+
+import os
+import re
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+# Max difference (seconds) between two uploads of the same song
+DURATION_TOLERANCE = 3
+
+# Bracketed tags made only of these words ("(Official Video)", "[Lyrics]",
+# "(HD Remastered 2011)") are dropped. Anything else - "(Instrumental Audio)",
+# "(Karaoke Video)", "(Live)", "(Acoustic)", "(Remix)", "(8D Audio)" - is a
+# different version of the song and stays in the key
+NOISE_WORDS = {
+    'official', 'music', 'video', 'audio', 'lyric', 'lyrics', 'visualizer',
+    'visualiser', 'hd', 'hq', '4k', 'remaster', 'remastered', 'explicit',
+    'clean', 'mv', 'm/v', 'with',
+}
+BRACKETS = re.compile(r'[\(\[]([^\)\]]*)[\)\]]')
+FEATURING = re.compile(r'\s*[\(\[]?\b(feat|ft|featuring)\b\.?.*$', re.IGNORECASE)
+CHANNEL_SUFFIX = re.compile(r'(\s*-\s*topic|vevo|\s*official)$', re.IGNORECASE)
+ARTIST_SEPARATORS = re.compile(r',|&|\bx\b|\band\b', re.IGNORECASE)
+
+
+def _strip_noise_tag(match):
+    words = re.findall(r'[\w/]+', match.group(1).lower())
+    if words and all(w in NOISE_WORDS or w.isdigit() for w in words):
+        return ' '
+    return f' {match.group(1)} '
+
+
+def normalize(text: str):
+    """Lowercase, drop decorations and punctuation"""
+    text = BRACKETS.sub(_strip_noise_tag, text or '')
+    text = FEATURING.sub('', text)
+    text = re.sub(r'[^\w\s]', ' ', text.lower())
+    return ' '.join(text.split())
+
+
+def track_key(info: dict):
+    """Build a normalized 'artist|title' key from yt-dlp metadata"""
+    title = info.get('track') or info.get('title') or ''
+    artist = info.get('artist') or info.get('creator') or ''
+
+    # Most uploads are titled "Artist - Song (Official Video)"
+    if not info.get('track') and ' - ' in title:
+        artist, title = title.split(' - ', 1)
+    if not artist:
+        artist = CHANNEL_SUFFIX.sub('', info.get('uploader') or info.get('channel') or '')
+
+    # Only the main artist - featured artists vary between uploads
+    artist = ARTIST_SEPARATORS.split(artist)[0]
+
+    artist, title = normalize(artist), normalize(title)
+    if not artist or not title:
+        return None
+    return f"{artist}|{title}"
+
+
+class TrackIndex:
+    def __init__(self, path):
+        self.path = path
+        self.tracks = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.tracks = json.load(f)
+            log.info(f"📇 Loaded track index with {len(self.tracks)} track(s)")
+        except Exception as e:
+            log.error(f"Track index load error: {e}")
+            self.tracks = {}
+
+    def save(self):
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.tracks, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            log.error(f"Track index save error: {e}")
+
+    def lookup(self, info: dict):
+        """Return a cached file for this video or an equivalent upload"""
+        key = track_key(info)
+        if not key or key not in self.tracks:
+            return None
+
+        duration = info.get('duration') or 0
+        entries = self.tracks[key]
+
+        # Forget files that were deleted from disk
+        alive = [e for e in entries if os.path.exists(e['file'])]
+        if len(alive) != len(entries):
+            if alive:
+                self.tracks[key] = alive
+            else:
+                del self.tracks[key]
+            self.save()
+
+        for entry in alive:
+            if entry['id'] == info.get('id'):
+                return entry['file']
+        for entry in alive:
+            if duration and abs(entry['duration'] - duration) <= DURATION_TOLERANCE:
+                return entry['file']
+        return None
+
+    def add(self, info: dict, filename: str):
+        """Record a finished download"""
+        key = track_key(info)
+        if not key:
+            return
+
+        entries = [e for e in self.tracks.get(key, []) if e['id'] != info.get('id')]
+        entries.append({
+            'id': info.get('id'),
+            'file': filename,
+            'duration': info.get('duration') or 0,
+        })
+        self.tracks[key] = entries
+        self.save()
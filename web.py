@@ -4,10 +4,12 @@ This prevents the bot from sleeping due to inactivity
 """
 
 import os
+import hmac
 from aiohttp import web
 import asyncio
-import aiohttp
 import logging
+from http_client import get_session
+from log_config import set_ytdl_verbose, is_ytdl_verbose
 
 log = logging.getLogger(__name__)
 
@@ -18,6 +20,9 @@ WEB_URL = os.getenv('WEB_URL', 'https://your-music-bot.onrender.com/')
 # Ping interval - 3 minutes (180 seconds)
 WEB_SLEEP = 3 * 60
 
+# Secret for the admin endpoints /drain and /debug/ytdl (disabled if not set)
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
 routes = web.RouteTableDef()
 
 
@@ -43,9 +48,45 @@ async def status_handler(request):
     })
 
 
-def web_server():
+def is_authorized(request):
+    """Check the X-Admin-Token header against ADMIN_TOKEN"""
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+@routes.post('/drain')
+async def drain_handler(request):
+    """Start drain mode before a redeploy (requires X-Admin-Token header)"""
+    if not is_authorized(request):
+        return web.json_response({'error': 'forbidden'}, status=403)
+    
+    on_drain = request.app.get('on_drain')
+    if on_drain is None:
+        return web.json_response({'error': 'drain not supported'}, status=503)
+    
+    on_drain()
+    return web.json_response({'status': 'draining'})
+
+
+@routes.post('/debug/ytdl')
+async def ytdl_debug_handler(request):
+    """Switch yt-dlp verbose logging: /debug/ytdl?verbose=on|off"""
+    if not is_authorized(request):
+        return web.json_response({'error': 'forbidden'}, status=403)
+    
+    verbose = request.query.get('verbose', '').lower()
+    if verbose not in ('on', 'off'):
+        return web.json_response({'error': 'verbose must be on or off'}, status=400)
+    
+    set_ytdl_verbose(verbose == 'on')
+    log.info(f"yt-dlp verbose logging {verbose}")
+    return web.json_response({'ytdl_verbose': is_ytdl_verbose()})
+
+
+def web_server(on_drain=None):
     """Create and configure the web server"""
     app = web.Application()
+    app['on_drain'] = on_drain
     app.add_routes(routes)
     return app
 
@@ -62,13 +103,13 @@ async def keep_alive():
             await asyncio.sleep(WEB_SLEEP)
             
             try:
-                async with aiohttp.ClientSession(
-                    timeout=aiohttp.ClientTimeout(total=10)
-                ) as session:
-                    async with session.get(WEB_URL) as resp:
-                        log.info(
-                            f"✅ Pinged {WEB_URL} - Status: {resp.status}"
-                        )
+                # Reuse the shared pooled session (keep-alive + DNS cache)
+                session = get_session()
+                async with session.get(WEB_URL) as resp:
+                    await resp.read()
+                    log.info(
+                        f"✅ Pinged {WEB_URL} - Status: {resp.status}"
+                    )
             except asyncio.TimeoutError:
                 log.warning("⚠️ Keep-alive ping timeout")
             except Exception as e: